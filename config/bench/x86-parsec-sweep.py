@@ -0,0 +1,197 @@
+# Copyright (c) 2025 Tampere University, Finland
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met: redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer;
+# redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution;
+# neither the name of the copyright holders nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+
+"""
+Run a sweep of PARSEC benchmarks/sizes with x86-parsec.py, several gem5
+processes at a time. Each (benchmark, size) gets its own gem5 output
+directory (OUTDIR/BENCHMARK-SIZE) with the redirected stdout/stderr.
+
+This is a plain python script, it is not run by gem5. Any argument it does
+not know is forwarded to x86-parsec.py.
+
+Usage
+-----
+```
+
+# All benchmarks and sizes, half the host cores
+    python3 config/bench/x86-parsec-sweep.py
+
+# Some benchmarks, 4 simulations at a time, restored from ROI checkpoints
+    python3 config/bench/x86-parsec-sweep.py \
+        --benchmarks blackscholes canneal \
+        --sizes simsmall \
+        --jobs 4 \
+        --mode restore
+
+```
+"""
+
+
+import argparse
+import os
+import subprocess
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+
+# PATHS
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "../../"))
+GEM5_DEFAULT = os.path.join(BASE_DIR, "gem5", "build", "X86_CHI", "gem5.opt")
+PARSEC_SCRIPT = os.path.join(BASE_DIR, "config", "bench", "x86-parsec.py")
+OUTDIR_DEFAULT = os.path.join(BASE_DIR, "out", "parsec-sweep")
+RESOURCE_DIR_DEFAULT = os.environ.get(
+    "GEM5_RESOURCE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "gem5")
+)
+
+# Resources fetched by x86-parsec.py, as named in the resource directory
+RESOURCES = ["x86-linux-kernel-4.19.83-1.0.0", "x86-parsec-1.0.0"]
+
+
+# Keep in sync with x86-parsec.py
+benchmark_choices = [
+    "blackscholes",
+    "bodytrack",
+    "canneal",
+    "dedup",
+    "facesim",
+    "ferret",
+    "fluidanimate",
+    "freqmine",
+    "raytrace",
+    "streamcluster",
+    "swaptions",
+    "vips",
+    "x264",
+]
+
+size_choices = ["simsmall", "simmedium", "simlarge"]
+
+
+
+def run_one(gem5, outdir, benchmark, size, resource_dir, json_stats, extra_args):
+    run_dir = os.path.join(outdir, f"{benchmark}-{size}")
+
+    command = [gem5, f"--outdir={run_dir}", "--redirect-stdout", "--redirect-stderr"]
+    if json_stats:
+        command.append("--stats-file=json://stats.json")
+
+    command += [
+        PARSEC_SCRIPT,
+        "--benchmark", benchmark,
+        "--size", size,
+        "--resource-dir", resource_dir,
+    ] + extra_args
+
+    print(f"Starting {benchmark} {size} -> {run_dir}")
+    # gem5 has to be run from the repo root for the config.chi imports
+    returncode = subprocess.run(command, cwd=BASE_DIR).returncode
+    print(f"Finished {benchmark} {size} (exit code {returncode})")
+
+    return returncode
+
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Run a sweep of PARSEC benchmarks with several gem5 processes in parallel.",
+        # Unknown arguments are forwarded, do not match them as prefixes
+        allow_abbrev=False,
+    )
+    parser.add_argument(
+        "--benchmarks",
+        type=str,
+        nargs="+",
+        default=benchmark_choices,
+        choices=benchmark_choices,
+        help="Benchmarks to run (default: all)",
+    )
+    parser.add_argument(
+        "--sizes",
+        type=str,
+        nargs="+",
+        default=size_choices,
+        choices=size_choices,
+        help="Simulation sizes to run (default: all)",
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=max(1, (os.cpu_count() or 2) // 2),
+        help="Number of gem5 processes running at the same time (default: half the host cores)",
+    )
+    parser.add_argument("--gem5", type=str, default=GEM5_DEFAULT, help="Path to the X86_CHI gem5 binary")
+    parser.add_argument(
+        "--outdir", type=str, default=OUTDIR_DEFAULT, help="Base output directory of the sweep"
+    )
+    parser.add_argument(
+        "--resource-dir",
+        type=str,
+        default=RESOURCE_DIR_DEFAULT,
+        help="gem5 resources directory shared by all the runs "
+        "(default: $GEM5_RESOURCE_DIR or ~/.cache/gem5)",
+    )
+    parser.add_argument("--json-stats", action="store_true", help="Dump the stats as stats.json")
+
+    args, extra_args = parser.parse_known_args()
+
+    runs = [(benchmark, size) for benchmark in args.benchmarks for size in args.sizes]
+
+    def submit(benchmark, size):
+        return run_one(
+            args.gem5, args.outdir, benchmark, size, args.resource_dir, args.json_stats, extra_args
+        )
+
+    results = {}
+
+    # The kernel and disk image are downloaded on first use. Run the first
+    # simulation alone so it fills the resource directory, instead of every
+    # process racing to download the same (multi-GB) disk image.
+    cached = all(
+        os.path.isfile(os.path.join(args.resource_dir, resource)) for resource in RESOURCES
+    )
+    if not cached:
+        print(f"Resources are not in {args.resource_dir} yet, running {runs[0]} first")
+        results[runs[0]] = submit(*runs[0])
+        runs = runs[1:]
+
+    # Each job just waits on its gem5 process, threads are enough
+    with ThreadPoolExecutor(max_workers=args.jobs) as executor:
+        for run, returncode in zip(runs, executor.map(lambda run: submit(*run), runs)):
+            results[run] = returncode
+
+    failed = [run for run, returncode in results.items() if returncode != 0]
+
+    print(f"\n ====== Sweep done: {len(results) - len(failed)}/{len(results)} runs succeeded ======")
+    for benchmark, size in failed:
+        print(f"FAILED: {benchmark} {size} (exit code {results[(benchmark, size)]})")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -57,15 +57,20 @@ scons build/X86/gem5.opt
 
 
 import argparse
+import atexit
+import configparser
+import functools
+import os
+import sys
 import time
 
 import m5
 from m5.objects import Root
+from m5.util import warn
 
 from gem5.components.boards.x86_board import X86Board
 from gem5.components.memory import DualChannelDDR4_2400, SingleChannelDDR3_1600
 from gem5.components.processors.cpu_types import CPUTypes
-from gem5.components.processors.simple_processor import SimpleProcessor
 from gem5.isas import ISA
 from gem5.resources.resource import (
     obtain_resource,
@@ -80,13 +85,13 @@ from gem5.components.processors.simple_switchable_processor import SimpleSwitcha
 
 
 
-# Verify ISA
-# We check for the required gem5 build.
-requires(
-    isa_required=ISA.X86,
-    kvm_required=True,
-)
 
+# PATHS
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "../../"))
+CHECKPOINT_BASE_DIR = os.path.join(BASE_DIR, "checkpoints")
+RESOURCE_DIR_DEFAULT = os.environ.get(
+    "GEM5_RESOURCE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "gem5")
+)
 
 
 # Following are the list of benchmark programs for parsec.
@@ -124,9 +129,29 @@ parser.add_argument(
     choices=["chi", "mesi-three-level", "no-cache"],
     help="Cache hierarchy class to use",
 )
+parser.add_argument(
+    "--topology",
+    type=str,
+    default="star",
+    choices=["star", "mesh", "crossbar"],
+    help="CHI network topology, mesh spreads the L3 traffic for large core counts (>= 8 cores)",
+)
+parser.add_argument(
+    "--num-l3-banks",
+    type=int,
+    default=1,
+    help="Number of address-interleaved L3 banks (power of 2), the L3 size is split across them",
+)
 parser.add_argument(
     "--mem-size", type=str, default="3GiB", help="Memory size (e.g., 2GiB, 8GiB)"
 )
+parser.add_argument(
+    "--mem-type",
+    type=str,
+    default="ddr4-2ch",
+    choices=["ddr3-1ch", "ddr4-2ch"],
+    help="Memory model: ddr3-1ch (SingleChannelDDR3_1600) or ddr4-2ch (DualChannelDDR4_2400)",
+)
 
 # The arguments accepted are the benchmark name and the simulation size.
 
@@ -146,10 +171,104 @@ parser.add_argument(
     choices=size_choices,
 )
 
+# The cores used to fast-forward up to the ROI. KVM needs a KVM capable host,
+# atomic runs anywhere.
+parser.add_argument(
+    "--starting-cpu",
+    type=str,
+    default="kvm",
+    choices=["kvm", "atomic"],
+    help="Type of CPU model used to boot and reach the ROI: kvm (KvmCPU) or atomic (AtomicSimpleCPU)",
+)
+
+# Checkpointing: "take" boots with the starting cpu and saves a checkpoint at the ROI
+# begin (m5_work_begin), "restore" starts directly from that checkpoint on
+# the detailed cores, "run" does the whole thing in one go.
+parser.add_argument(
+    "--mode",
+    type=str,
+    default="run",
+    choices=["run", "take", "restore"],
+    help="run: boot and simulate the ROI, take: save a checkpoint at the ROI begin and exit, "
+    "restore: resume from a checkpoint taken at the ROI begin",
+)
+parser.add_argument(
+    "--checkpoint-dir",
+    type=str,
+    default=None,
+    help="Path to the ROI checkpoint directory "
+    "(default: checkpoints/x86-parsec-BENCHMARK-SIZE-NUM_CORESc-MEM_SIZE-STARTING_CPU)",
+)
+
+parser.add_argument(
+    "--resource-dir",
+    type=str,
+    default=RESOURCE_DIR_DEFAULT,
+    help="Directory where the gem5 resources (kernel, disk image) are cached across runs "
+    "(default: $GEM5_RESOURCE_DIR or ~/.cache/gem5)",
+)
+
+# Bound the run, for benchmarks that crash or never reach the ROI end
+parser.add_argument(
+    "--max-ticks",
+    type=int,
+    default=None,
+    help="Stop when a simulation segment runs for this many ticks, dumping the partial "
+    "stats. The budget restarts at every handled exit event: in run mode the boot (up "
+    "to the ROI begin) and the ROI each get the whole budget",
+)
+parser.add_argument(
+    "--max-insts",
+    type=int,
+    default=None,
+    help="Stop after this many instructions on any core in the ROI, dumping the partial stats",
+)
+
+parser.add_argument(
+    "--no-dump-stats",
+    dest="dump_stats",
+    action="store_false",
+    help="Do not write any stats. By default they are dumped once, at the end of the ROI "
+    "(or when --max-ticks/--max-insts is reached)",
+)
+
 args = parser.parse_args()
 
 
 
+# Hosts without KVM (containers, ARM/macOS) boot on atomic cores rather than
+# aborting. The default checkpoint directory is named after the starting cpu:
+# a restore falls back the same way, to find the checkpoint that the same
+# command line took on this host
+if args.starting_cpu == "kvm" and not os.access("/dev/kvm", os.R_OK | os.W_OK):
+    if args.mode == "restore":
+        warn("KVM is not available on this host, restoring a checkpoint taken on atomic cores.")
+    else:
+        warn("KVM is not available on this host, booting on atomic cores instead.")
+    args.starting_cpu = "atomic"
+
+# Verify ISA
+# We check for the required gem5 build. KVM is only needed to boot on KVM cores,
+# a restored run starts directly on the detailed cores.
+kvm_required = args.starting_cpu == "kvm" and args.mode != "restore"
+
+requires(
+    isa_required=ISA.X86,
+    kvm_required=kvm_required,
+)
+
+# Make gem5 itself agree on the resources location
+os.environ.setdefault("GEM5_RESOURCE_DIR", args.resource_dir)
+
+if args.checkpoint_dir is None:
+    args.checkpoint_dir = os.path.join(
+        CHECKPOINT_BASE_DIR,
+        f"x86-parsec-{args.benchmark}-{args.size}-{args.num_cores}c-{args.mem_size}"
+        f"-{args.starting_cpu}",
+    )
+
+
+
 # -------------------------------------------------------
 # Cache hierarchy setup
 # -------------------------------------------------------
@@ -159,16 +278,12 @@ if args.cache_class == "no-cache":
     cache_hierarchy = NoCache()
 elif args.cache_class == "chi":
     # Custom CHI-based hierarchy
-    from config.chi.l3_cache_hierarchy import L3CacheHierarchy
+    from config.chi.presets import default_l3
     
-    cache_hierarchy = L3CacheHierarchy(
-        l1_size="16KiB",
-        l1_assoc=8,
-        l2_size="1MiB",
-        l2_assoc=16,
-        l3_size="16MiB",
-        l3_assoc=32,
+    cache_hierarchy = default_l3(
         cores_per_cluster=args.cores_per_cluster,
+        topology=args.topology,
+        num_l3_banks=args.num_l3_banks,
     )
 elif args.cache_class == "mesi-three-level": 
     from gem5.components.cachehierarchies.ruby.mesi_three_level_cache_hierarchy import (
@@ -184,7 +299,7 @@ elif args.cache_class == "mesi-three-level":
         l2_assoc=4,
         l3_size="16MiB",
         l3_assoc=16,
-        num_l3_banks=1,
+        num_l3_banks=args.num_l3_banks,
     )
 else:
     raise ValueError(f"The cache class {args.cache_class} is not supported.")
@@ -194,15 +309,33 @@ else:
 # -------------------------------------------------------
 # Memory setup
 # -------------------------------------------------------
-memory = SingleChannelDDR3_1600(size=args.mem_size)
-# or: memory = DualChannelDDR4_2400(size="3GiB")
+# Bandwidth bound benchmarks (streamcluster, canneal, fluidanimate) are capped
+# by a single DDR3 channel, hence the dual channel DDR4 default
+memory_classes = {
+    "ddr3-1ch": SingleChannelDDR3_1600,
+    "ddr4-2ch": DualChannelDDR4_2400,
+}
+memory = memory_classes[args.mem_type](size=args.mem_size)
 
 
 # -------------------------------------------------------
 # Processor setup
 # -------------------------------------------------------
+# The checkpoint holds the state of the starting cores of the switchable
+# processor it was taken with, it is restored into the same processor. The
+# restored run starts on the detailed cores: they are the starting cores
+# there, the processor is never switched.
+if args.mode == "restore":
+    starting_core_type = CPUTypes.TIMING
+elif args.starting_cpu == "kvm":
+    starting_core_type = CPUTypes.KVM
+elif args.starting_cpu == "atomic":
+    starting_core_type = CPUTypes.ATOMIC
+else:
+    raise ValueError(f"Unsupported starting CPU type: {args.starting_cpu}")
+
 processor = SimpleSwitchableProcessor(
-    starting_core_type=CPUTypes.KVM,
+    starting_core_type=starting_core_type,
     switch_core_type=CPUTypes.TIMING,
     isa=ISA.X86,
     num_cores=args.num_cores,
@@ -239,30 +372,50 @@ board = X86Board(
 # After the system boots, we execute the benchmark program and wait till the
 # ROI `workbegin` annotation is reached (m5_work_begin()). We start collecting
 # the number of committed instructions till ROI ends (marked by `workend`).
-# We then finish executing the rest of the benchmark.
-
-# Also, we sleep the system for some time so that the output is printed
-# properly.
+# The simulation exits at the end of the ROI, the final `m5 exit` only
+# matters when the benchmark never reaches its ROI.
 
 
 command = (
     f"cd /home/gem5/parsec-benchmark;"
     + "source env.sh;"
-    + f"parsecmgmt -a run -p {args.benchmark} -c gcc-hooks -i {args.size}         -n 2;"
-    + "sleep 5;"
+    + f"parsecmgmt -a run -p {args.benchmark} -c gcc-hooks -i {args.size} -n 2;"
     + "m5 exit;"
 )
 
 
 
 # obtain_resource methods download the images automatically from gem5_resource server
-# the resources are downloaded by default 
+# the resources are downloaded by default. Once a resource sits in the resource
+# directory it is used as a local resource, this skips the resource lookup and
+# the md5 check of the (multi-GB) disk image on every run.
+@functools.lru_cache(maxsize=None)
+def obtain_cached_resource(resource_id, resource_version, resource_class, **kwargs):
+    local_path = os.path.join(args.resource_dir, f"{resource_id}-{resource_version}")
+    if os.path.isfile(local_path):
+        return resource_class(local_path=local_path, **kwargs)
+
+    return obtain_resource(
+        resource_id,
+        resource_version=resource_version,
+        resource_directory=args.resource_dir,
+        to_path=local_path,
+    )
+
+
+# Note: the workload is set on restore as well, the board needs the kernel
+# and disk image to be re-attached before the checkpoint is loaded
+# The board opens the disk image read-only, guest writes go to an in-memory
+# copy-on-write layer (CowDiskImage) that is never written back. Concurrent
+# runs (see x86-parsec-sweep.py) can therefore share the same image file.
 board.set_kernel_disk_workload(
-    kernel=obtain_resource(
-        "x86-linux-kernel-4.19.83", resource_version="1.0.0"
+    kernel=obtain_cached_resource(
+        "x86-linux-kernel-4.19.83", "1.0.0", KernelResource
     ),
 
-    disk_image=obtain_resource("x86-parsec", resource_version="1.0.0"),
+    disk_image=obtain_cached_resource(
+        "x86-parsec", "1.0.0", DiskImageResource, root_partition="1"
+    ),
 
     readfile_contents=command,
 )
@@ -273,21 +426,64 @@ board.set_kernel_disk_workload(
 # Exit event handler
 # -------------------------------------------------------
 
-# functions to handle different exit events during the simuation
+# functions to handle different exit events during the simuation.
+# These are plain callbacks, called on every occurrence of their exit event,
+# returning True exits the simulation loop.
+switched_to_timing = False
+
+
 def handle_workbegin():
+    global switched_to_timing
+
     print("Done booting Linux")
+
+    if args.mode == "take":
+        print(f"Saving checkpoint to {args.checkpoint_dir} ...")
+        simulator.save_checkpoint(args.checkpoint_dir)
+        return True
+
+    # switch() toggles between the two core types, only do it once
+    if not switched_to_timing:
+        processor.switch()
+        switched_to_timing = True
+
+        # Counted on the detailed cores, from the ROI begin
+        if args.max_insts:
+            simulator.schedule_max_insts(args.max_insts)
+
+    # Only the ROI is of interest, the boot stats are dropped here
     print("Resetting stats at the start of ROI!")
     m5.stats.reset()
 
-    processor.switch()
+    return False
+
 
-    yield False
+roi_end_tick = None
 
 
 def handle_workend():
-    print("Dump stats at the end of the ROI!")
-    m5.stats.dump()
-    yield True
+    global roi_end_tick
+
+    roi_end_tick = simulator.get_current_tick()
+    if args.dump_stats:
+        print("Dump stats at the end of the ROI!")
+        m5.stats.dump()
+    return True
+
+
+limit_reached = False
+
+
+def handle_limit():
+    global limit_reached
+
+    print("TIMEOUT: --max-ticks/--max-insts reached before the ROI end")
+    if args.dump_stats:
+        print("Dump the partial stats!")
+        m5.stats.dump()
+
+    limit_reached = True
+    return True
 
 
 
@@ -295,15 +491,31 @@ def handle_workend():
 # -------------------------------------------------------
 # Simulator setup
 # -------------------------------------------------------
-simulator = Simulator(
-    board=board,
-
-    # checkpoint_path="/opt/gem5/parsec_cpt",
-    on_exit_event={
-        ExitEvent.WORKBEGIN: handle_workbegin(),
-        ExitEvent.WORKEND: handle_workend(),
-    },
-)
+if args.mode == "restore":
+    print(f"Loading checkpoint from {args.checkpoint_dir} ...")
+    simulator = Simulator(
+        board=board,
+        checkpoint_path=args.checkpoint_dir,
+        on_exit_event={
+            ExitEvent.WORKEND: handle_workend,
+            ExitEvent.MAX_TICK: handle_limit,
+            ExitEvent.MAX_INSTS: handle_limit,
+        },
+    )
+
+    # Scheduled on the starting cores, before the instantiation
+    if args.max_insts:
+        simulator.schedule_max_insts(args.max_insts)
+else:
+    simulator = Simulator(
+        board=board,
+        on_exit_event={
+            ExitEvent.WORKBEGIN: handle_workbegin,
+            ExitEvent.WORKEND: handle_workend,
+            ExitEvent.MAX_TICK: handle_limit,
+            ExitEvent.MAX_INSTS: handle_limit,
+        },
+    )
 
 
 # We maintain the wall clock time.
@@ -311,12 +523,22 @@ simulator = Simulator(
 globalStart = time.time()
 
 print("Running the simulation")
-print("Using KVM cpu")
+if args.mode == "restore":
+    print("Using Timing cpu")
+elif args.starting_cpu == "kvm":
+    print("Using KVM cpu")
+else:
+    print("Using Atomic cpu")
 
-m5.stats.reset()
+# We start the simulation. max_ticks is relative to the current tick and is
+# passed again to every m5.simulate() call, after each handled exit event: it
+# bounds each segment (boot, ROI), not the whole run
+simulator.run(max_ticks=args.max_ticks or m5.MaxTick)
 
-# We start the simulation
-simulator.run()
+# m5.simulate() registers an atexit stats.dump(): it would dump the stats a
+# second time, or despite --no-dump-stats. The exit handlers already dumped
+# the ROI stats, drop it
+atexit.unregister(m5.stats.dump)
 
 print("All simulation events were successful.")
 
@@ -326,7 +548,18 @@ print("Done with the simulation")
 print()
 print("Performance statistics:")
 
-print("Simulated time in ROI: " + (str(simulator.get_roi_ticks()[0])))
+# A restored run starts at the ROI begin and never sees WORKBEGIN, its ROI
+# starts at the tick the checkpoint was taken at
+if args.mode == "restore":
+    if roi_end_tick is not None:
+        checkpoint = configparser.ConfigParser(interpolation=None, strict=False)
+        checkpoint.read(os.path.join(args.checkpoint_dir, "m5.cpt"))
+        roi_start_tick = checkpoint.getint("Globals", "curTick")
+        print("Simulated time in ROI: " + str(roi_end_tick - roi_start_tick))
+else:
+    roi_ticks = simulator.get_roi_ticks()
+    if roi_ticks:
+        print("Simulated time in ROI: " + (str(roi_ticks[0])))
 print(
     "Ran a total of", simulator.get_current_tick() / 1e12, "simulated seconds"
 )
@@ -335,7 +568,6 @@ print(
     % (time.time() - globalStart, (time.time() - globalStart) / 60)
 )
 
-
-
-
-
+# Let the caller (e.g. x86-parsec-sweep.py) see the run did not complete
+if limit_reached:
+    sys.exit(1)
@@ -10,8 +10,9 @@ from .nodes.shared_l3 import SharedL3
 
 from .network.chi_noc import ChiNoC
 from .l3_cache_hierarchy import L3CacheHierarchy
+from .presets import default_l3
 
 
 
 __all__ = ['AbstractNode', 'SimpleDirectory', 'DMARequestor', 'MemoryController', 'PrivateL1MOESICache', 'SharedL2', 
-            'SharedL3', 'ChiNoC', 'L3CacheHierarchy']
\ No newline at end of file
+            'SharedL3', 'ChiNoC', 'L3CacheHierarchy', 'default_l3']
\ No newline at end of file
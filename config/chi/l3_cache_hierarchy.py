@@ -26,10 +26,12 @@
 
 
 
-from itertools import chain
+import functools
+import math
 from typing import List
 
 import m5
+from m5.util.convert import toMemorySize
 from m5.objects import (
     NULL,
     RubyPortProxy,
@@ -43,7 +45,6 @@ from m5.objects import (
     TaggedPrefetcher,
     BOPPrefetcher,
 )
-from m5.objects.SubSystem import SubSystem
 
 from gem5.coherence_protocol import CoherenceProtocol
 from gem5.utils.requires import requires
@@ -88,12 +89,15 @@ class L3CacheHierarchy(AbstractRubyCacheHierarchy):
         A three level cache based on CHI
     """
 
-    def __init__(self, l1_size: str, l1_assoc: int, l2_size: str, l2_assoc: int, l3_size: str, l3_assoc: int, cores_per_cluster: int):
+    def __init__(self, l1_size: str, l1_assoc: int, l2_size: str, l2_assoc: int, l3_size: str, l3_assoc: int, cores_per_cluster: int, topology: str = "star", num_l3_banks: int = 1):
         """
         :param l1_size: The size of the priavte I/D caches in the hierarchy.
         :param l1_assoc: The associativity of each cache.
         :param l2_size: The size of the shared L2 cache.
         :param l2_assoc: The associativity of the shared L2 cache.
+        :param topology: The ChiNoC topology, one of "star", "mesh" or "crossbar".
+        :param num_l3_banks: The number of L3 banks (home nodes), a power of 2.
+                             l3_size is split evenly across the banks.
         """
         super().__init__()
 
@@ -104,9 +108,31 @@ class L3CacheHierarchy(AbstractRubyCacheHierarchy):
         self._l3_size = l3_size
         self._l3_assoc = l3_assoc
         self._cores_per_cluster = cores_per_cluster
+        self._topology = topology
+        self._num_l3_banks = num_l3_banks
         self._enable_l1_prefetch = False
         self._enable_l2_prefetch = False
 
+    @classmethod
+    @functools.lru_cache(maxsize=None)
+    def factory(cls, l1_size: str, l1_assoc: int, l2_size: str, l2_assoc: int, l3_size: str, l3_assoc: int, cores_per_cluster: int, topology: str = "star", num_l3_banks: int = 1):
+        """Return the hierarchy for this parameter set, creating it on the
+        first call only. Meant for drivers that build the same configuration
+        several times within one gem5 process. As any SimObject, the returned
+        hierarchy can only be incorporated into one board.
+        """
+        return cls(
+            l1_size=l1_size,
+            l1_assoc=l1_assoc,
+            l2_size=l2_size,
+            l2_assoc=l2_assoc,
+            l3_size=l3_size,
+            l3_assoc=l3_assoc,
+            cores_per_cluster=cores_per_cluster,
+            topology=topology,
+            num_l3_banks=num_l3_banks,
+        )
+
 
     def incorporate_cache(self, board):
 
@@ -115,24 +141,24 @@ class L3CacheHierarchy(AbstractRubyCacheHierarchy):
         # Most Ruby controllers, etc. need a pointer to this.
         self.ruby_system = RubySystem()
 
-        num_cores = len(board.get_processor().get_cores())
+        # These are looked up for every controller, fetch them once
+        cores = board.get_processor().get_cores()
+        num_cores = len(cores)
+        cache_line_size = board.get_cache_line_size()
+        isa = board.get_processor().get_isa()
+        clk_domain = board.get_clock_domain()
 
         # Ruby's global network.
-        self.ruby_system.network = ChiNoC(self.ruby_system, num_cores, self._cores_per_cluster, board.has_dma_ports())
+        self.ruby_system.network = ChiNoC(self.ruby_system, num_cores, self._cores_per_cluster, topology=self._topology)
 
         # Network configurations
         # virtual networks: 0=request, 1=snoop, 2=response, 3=data
         self.ruby_system.number_of_virtual_networks = 4
         self.ruby_system.network.number_of_virtual_networks = 4
 
-        # Create a single centralized L3/Home node
-        self.l3cache = SharedL3(
-            size=self._l3_size,
-            assoc=self._l3_assoc,
-            network=self.ruby_system.network,
-            cache_line_size=board.get_cache_line_size()
-        )
-        self.l3cache.ruby_system = self.ruby_system
+        # Create the L3/Home nodes, each bank is the home of an interleaved
+        # slice of the memory
+        self.l3caches = self._create_l3_caches(board, cache_line_size)
 
         
         num_l2_caches = num_cores // self._cores_per_cluster 
@@ -149,7 +175,7 @@ class L3CacheHierarchy(AbstractRubyCacheHierarchy):
                 size=self._l2_size, 
                 assoc=self._l2_assoc, 
                 network=self.ruby_system.network, 
-                cache_line_size=board.get_cache_line_size(),
+                cache_line_size=cache_line_size,
                 prefetcher_=l2_prefetchers[i]
             ) 
             l2_caches.append(l2_cache) 
@@ -168,11 +194,18 @@ class L3CacheHierarchy(AbstractRubyCacheHierarchy):
 
         
 
-        # Create one core cluster with a split I/D cache for each core
-        self.core_clusters = [
-            self._create_core_cluster(core, i, board, l2_caches, l1_prefetchers, self._cores_per_cluster)
-            for i, core in enumerate(board.get_processor().get_cores())
+        # Create a split I/D cache for each core. The caches are kept in two
+        # flat lists (dcaches[i], icaches[i] belong to core i) rather than in
+        # one SubSystem per core.
+        l1_caches = [
+            self._create_l1_caches(
+                core, i, board, l2_caches, l1_prefetchers, self._cores_per_cluster,
+                cache_line_size=cache_line_size, isa=isa, clk_domain=clk_domain
+            )
+            for i, core in enumerate(cores)
         ]
+        self.dcaches = [dcache for dcache, _ in l1_caches]
+        self.icaches = [icache for _, icache in l1_caches]
 
 
         # Create the coherent side of the memory controllers
@@ -181,40 +214,48 @@ class L3CacheHierarchy(AbstractRubyCacheHierarchy):
 
         # In CHI, you must explicitly set downstream controllers
         for cache in l2_caches:
-            cache.downstream_destinations = [self.l3cache]
+            cache.downstream_destinations = self.l3caches
 
-        self.l3cache.downstream_destinations = self.memory_controllers
+        for l3cache in self.l3caches:
+            l3cache.downstream_destinations = self.memory_controllers
 
 
         # Create the DMA Controllers, if required as in FS mode
         if board.has_dma_ports():
-            dma_controllers = self._create_dma_controllers(board)
+            dma_controllers = self._create_dma_controllers(
+                board, cache_line_size=cache_line_size, clk_domain=clk_domain, num_cores=num_cores
+            )
             self.ruby_system.num_of_sequencers = len(
-                self.core_clusters
+                self.dcaches
             ) * 2 + len(dma_controllers)
         else:
             dma_controllers = [] 
-            self.ruby_system.num_of_sequencers = len(self.core_clusters) * 2
-
-
-        # Connect the controllers within the network. Note that this function
-        # makes assumptions on the order of the controllers. If you want to
-        # use more complex topologies like mesh it would be a good idea to
-        # tightly couple the network with the cache hierarchy.
-        self.ruby_system.network.connectControllers(
-            list(
-                chain.from_iterable(  # Grab the controllers from each cluster
-                    [
-                        (cluster.dcache, cluster.icache)
-                        for cluster in self.core_clusters
-                    ]
-                )
-            )
-            + l2_caches
-            + [self.l3cache]
-            + self.memory_controllers
-            + dma_controllers
-        )
+            self.ruby_system.num_of_sequencers = len(self.dcaches) * 2
+
+
+        # Connect the controllers within the network. The network gets the
+        # index of the controllers of each role explicitly, it does not make
+        # assumptions on their order or count.
+        controllers = []
+        roles = {"l1d": [], "l1i": []}
+
+        # Grab the L1 controllers of each core
+        for dcache, icache in zip(self.dcaches, self.icaches):
+            roles["l1d"].append(len(controllers))
+            controllers.append(dcache)
+            roles["l1i"].append(len(controllers))
+            controllers.append(icache)
+
+        for role, role_controllers in (
+            ("l2", l2_caches),
+            ("l3", self.l3caches),
+            ("mc", self.memory_controllers),
+            ("dma", dma_controllers),
+        ):
+            roles[role] = list(range(len(controllers), len(controllers) + len(role_controllers)))
+            controllers.extend(role_controllers)
+
+        self.ruby_system.network.connectControllers(controllers, roles)
 
         self.ruby_system.network.setup_buffers()
 
@@ -226,69 +267,62 @@ class L3CacheHierarchy(AbstractRubyCacheHierarchy):
 
 
 
-    def _create_core_cluster(
-        self, core, core_num: int, board, l2_caches, l1_prefetchers, cores_per_cluster
-    ) -> SubSystem:
-        """Given the core and the core number this function creates a cluster
-        for the core with a split I/D cache.
+    def _create_l1_caches(
+        self, core, core_num: int, board, l2_caches, l1_prefetchers, cores_per_cluster,
+        cache_line_size, isa: ISA, clk_domain
+    ):
+        """Given the core and the core number this function creates the split
+        I/D cache of the core, returned as a (dcache, icache) pair.
         """
-        # Create a cluster for each core.
-        cluster = SubSystem()
-
-        # Create the caches
-        cluster.dcache = PrivateL1MOESICache(
+        # Create the caches, the I and D caches only differ by their prefetcher
+        l1_params = dict(
             size=self._l1_size,
             assoc=self._l1_assoc,
             network=self.ruby_system.network,
             core=core,
-            cache_line_size=board.get_cache_line_size(),
-            target_isa=board.get_processor().get_isa(),
-            clk_domain=board.get_clock_domain(),
-            prefetcher_=l1_prefetchers[core_num].get("L1d")
+            cache_line_size=cache_line_size,
+            target_isa=isa,
+            clk_domain=clk_domain,
         )
-        cluster.icache = PrivateL1MOESICache(
-            size=self._l1_size,
-            assoc=self._l1_assoc,
-            network=self.ruby_system.network,
-            core=core,
-            cache_line_size=board.get_cache_line_size(),
-            target_isa=board.get_processor().get_isa(),
-            clk_domain=board.get_clock_domain(),
-            prefetcher_=l1_prefetchers[core_num].get("L1i")
+        dcache = PrivateL1MOESICache(
+            **l1_params, prefetcher_=l1_prefetchers[core_num].get("L1d")
+        )
+        icache = PrivateL1MOESICache(
+            **l1_params, prefetcher_=l1_prefetchers[core_num].get("L1i")
         )
 
         # The sequencers are used to connect the core to the cache
-        cluster.icache.sequencer = RubySequencer(
-            version=core_num, dcache=NULL, clk_domain=cluster.icache.clk_domain, ruby_system=self.ruby_system
+        icache.sequencer = RubySequencer(
+            version=core_num, dcache=NULL, clk_domain=icache.clk_domain, ruby_system=self.ruby_system
         )
-        cluster.dcache.sequencer = RubySequencer(
+        dcache.sequencer = RubySequencer(
             version=core_num,
-            dcache=cluster.dcache.cache,
-            clk_domain=cluster.dcache.clk_domain,
+            dcache=dcache.cache,
+            clk_domain=dcache.clk_domain,
             ruby_system=self.ruby_system
         )
 
         # If full system, connect the IO bus to the sequencer
         if board.has_io_bus():
-            cluster.dcache.sequencer.connectIOPorts(board.get_io_bus())
+            dcache.sequencer.connectIOPorts(board.get_io_bus())
 
-        cluster.dcache.ruby_system = self.ruby_system
-        cluster.icache.ruby_system = self.ruby_system
+        dcache.ruby_system = self.ruby_system
+        icache.ruby_system = self.ruby_system
 
         # Connect the core "classic" ports to the sequencers
-        core.connect_icache(cluster.icache.sequencer.in_ports)
-        core.connect_dcache(cluster.dcache.sequencer.in_ports)
+        core.connect_icache(icache.sequencer.in_ports)
+        core.connect_dcache(dcache.sequencer.in_ports)
 
         # Same thing for the page table walkers
         core.connect_walker_ports(
-            cluster.dcache.sequencer.in_ports,
-            cluster.icache.sequencer.in_ports,
+            dcache.sequencer.in_ports,
+            icache.sequencer.in_ports,
         )
 
         # Connect the interrupt ports
-        if board.get_processor().get_isa() == ISA.X86:
-            int_req_port = cluster.dcache.sequencer.interrupt_out_port
-            int_resp_port = cluster.dcache.sequencer.in_ports
+        if isa == ISA.X86:
+            int_req_port = dcache.sequencer.interrupt_out_port
+            int_resp_port = dcache.sequencer.in_ports
             core.connect_interrupt(int_req_port, int_resp_port)
         else:
             core.connect_interrupt()
@@ -297,12 +331,48 @@ class L3CacheHierarchy(AbstractRubyCacheHierarchy):
         # Set the downstream destinations for the caches
         l2_idx = core_num // cores_per_cluster
         
-        cluster.dcache.downstream_destinations = [l2_caches[l2_idx]]
-        cluster.icache.downstream_destinations = [l2_caches[l2_idx]]
+        dcache.downstream_destinations = [l2_caches[l2_idx]]
+        icache.downstream_destinations = [l2_caches[l2_idx]]
         
-        return cluster
+        return dcache, icache
 
 
+    def _create_l3_caches(self, board, cache_line_size):
+        """Create the L3 banks. Bank i is the home node of the cache lines
+        whose interleaving bits, right above the line offset, are equal to i.
+        """
+        num_banks = self._num_l3_banks
+        intlv_bits = int(math.log(num_banks, 2)) if num_banks > 0 else 0
+        if 2**intlv_bits != num_banks:
+            raise ValueError(f"The number of L3 banks ({num_banks}) must be a power of 2.")
+
+        # Same interleaving as the HNFs of gem5's configs/ruby/CHI_config.py
+        intlv_high_bit = int(math.log(cache_line_size, 2)) + intlv_bits - 1
+        bank_size = f"{toMemorySize(self._l3_size) // num_banks}B"
+
+        l3_caches = []
+        for i in range(num_banks):
+            l3_cache = SharedL3(
+                size=bank_size,
+                assoc=self._l3_assoc,
+                network=self.ruby_system.network,
+                cache_line_size=cache_line_size
+            )
+            l3_cache.addr_ranges = [
+                AddrRange(
+                    rng.start,
+                    size=rng.size(),
+                    intlvHighBit=intlv_high_bit,
+                    intlvBits=intlv_bits,
+                    intlvMatch=i,
+                )
+                for rng in board.mem_ranges
+            ]
+            l3_cache.ruby_system = self.ruby_system
+            l3_caches.append(l3_cache)
+
+        return l3_caches
+
     def _create_memory_controllers(
         self, board
     ):
@@ -317,23 +387,23 @@ class L3CacheHierarchy(AbstractRubyCacheHierarchy):
         return memory_controllers
 
     def _create_dma_controllers(
-        self, board
+        self, board, cache_line_size, clk_domain, num_cores
     ):
         dma_controllers = []
         for i, port in enumerate(board.get_dma_ports()):
             ctrl = DMARequestor(
                 self.ruby_system.network,
-                board.get_cache_line_size(),
-                board.get_clock_domain(),
+                cache_line_size,
+                clk_domain,
             )
-            version = len(board.get_processor().get_cores()) + i
+            version = num_cores + i
             ctrl.sequencer = RubySequencer(version=version, in_ports=port)
             ctrl.sequencer.dcache = NULL
 
             ctrl.ruby_system = self.ruby_system
             ctrl.sequencer.ruby_system = self.ruby_system
 
-            ctrl.downstream_destinations = [self.l3cache]
+            ctrl.downstream_destinations = self.l3caches
 
             dma_controllers.append(ctrl)
 
@@ -25,6 +25,9 @@
 # OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
 
+import math
+from itertools import product
+
 from m5.objects import (
     SimpleExtLink,
     SimpleIntLink,
@@ -34,9 +37,24 @@ from m5.objects import (
 
 
 class ChiNoC(SimpleNetwork):
-    """A custom hierarchical network. This doesn't not use garnet -yet-."""
+    """A custom hierarchical network. This doesn't not use garnet -yet-.
+
+    The controllers are connected according to the topology:
+        star:     the L1s link to their cluster's L2, every L2, memory
+                  controller and DMA links to every L3 bank
+        mesh:     the L1s link to their cluster's L2, the L2s, L3 banks,
+                  memory controllers and DMAs sit on a 2D mesh with the L3
+                  banks in the middle; spreads the traffic over more routers
+                  (>= 8 cores)
+        crossbar: every controller links to a single crossbar switch
+    """
+
+    _topologies = ("star", "mesh", "crossbar")
 
-    def __init__(self, ruby_system, num_cores, cores_per_cluster, has_dma_ports):
+    # Latency (in cycles) of one internal link
+    _hop_latency = 1
+
+    def __init__(self, ruby_system, num_cores, cores_per_cluster, topology="star"):
         super().__init__()
         self.netifs = []
 
@@ -44,16 +62,42 @@ class ChiNoC(SimpleNetwork):
         # https://gem5.atlassian.net/browse/GEM5-1039
         self.ruby_system = ruby_system
 
+        if topology not in self._topologies:
+            raise ValueError(f"The topology {topology} is not supported.")
+
         self._num_cores = num_cores
         self._cores_per_cluster = cores_per_cluster
-        self._has_dma_ports = has_dma_ports
+        self._topology = topology
 
-    def connectControllers(self, controllers):
-        """
-        """
+    def connectControllers(self, controllers, roles):
+        """Create the routers and the links of the network, one router per
+        controller.
 
-        # Create one router/switch per controller in the system
-        self.routers = [Switch(router_id=i) for i in range(len(controllers))]
+        :param controllers: All the controllers of the system.
+        :param roles: The indices in controllers (i.e. the router) of the
+                      controllers of each role: "l1d", "l1i" (one per core),
+                      "l2" (one per cluster), "l3" (one per bank), "mc"
+                      and "dma".
+        """
+        num_ctrls = len(controllers)
+        if sum(len(indices) for indices in roles.values()) != num_ctrls:
+            raise ValueError("Every controller must have exactly one role.")
+
+        self._router_of = roles
+
+        if self._topology == "star":
+            num_routers, edges = self._build_star(num_ctrls)
+        elif self._topology == "mesh":
+            num_backbone = sum(len(roles[role]) for role in ("l2", "l3", "mc", "dma"))
+            rows = max(1, int(math.sqrt(num_backbone)))
+            cols = math.ceil(num_backbone / rows)
+            num_routers, edges = self._build_mesh(num_ctrls, rows, cols)
+        else:
+            num_routers, edges = self._build_crossbar(num_ctrls)
+
+        # Create one router/switch per controller in the system, plus the
+        # routers that only forward traffic (mesh fillers, crossbar)
+        self.routers = [Switch(router_id=i) for i in range(num_routers)]
 
         # Make a link from each controller to the router. The link goes
         # externally to the network.
@@ -62,73 +106,74 @@ class ChiNoC(SimpleNetwork):
             for i, c in enumerate(controllers)
         ]
 
+        # Internal link ids start at 1
+        routers = self.routers
+        self.int_links = [
+            SimpleIntLink(
+                link_id=i,
+                src_node=routers[src],
+                dst_node=routers[dst],
+                latency=self._hop_latency,
+            )
+            for i, (src, dst) in enumerate(edges, start=1)
+        ]
 
-        link_count = 0
-        int_links = []
-
-        
+    def _build_l1_edges(self):
+        """Links between each L1i/L1d and its cluster's L2"""
+        router_of = self._router_of
+        edges = []
         for core_idx in range(self._num_cores):
-            l2_idx = 2 * self._num_cores + core_idx // self._cores_per_cluster
-
-            link_count += 1
-            int_links.append(SimpleIntLink(link_id=link_count, src_node=self.routers[2*core_idx], dst_node=self.routers[l2_idx]))
-
-            link_count += 1
-            int_links.append(SimpleIntLink(link_id=link_count, src_node=self.routers[2*core_idx+1], dst_node=self.routers[l2_idx]))
-
-            link_count += 1
-            int_links.append(SimpleIntLink(link_id=link_count, src_node=self.routers[l2_idx], dst_node=self.routers[2*core_idx]))
-
-            link_count += 1
-            int_links.append(SimpleIntLink(link_id=link_count, src_node=self.routers[l2_idx], dst_node=self.routers[2*core_idx+1]))
-        
-
-
-        # Internal links between L3 (10) and L2s (9, 8)
-        num_l2s = self._num_cores // self._cores_per_cluster
-        l3_idx = 2 * self._num_cores + num_l2s
-
-        for i in range(num_l2s):
-            l2_idx = 2 * self._num_cores + i 
-
-            link_count += 1
-            int_links.append(SimpleIntLink(link_id=link_count, src_node=self.routers[l2_idx], dst_node=self.routers[l3_idx]))
-            
-            link_count += 1
-            int_links.append(SimpleIntLink(link_id=link_count, src_node=self.routers[l3_idx], dst_node=self.routers[l2_idx]))
-
-
-        mem_ctrl_idx = l3_idx + 1
-        # L3  ↔ MemCtrl 
-        link_count += 1
-        int_links.append(SimpleIntLink(link_id=link_count, src_node=self.routers[l3_idx], dst_node=self.routers[mem_ctrl_idx]))
-        link_count += 1
-        int_links.append(SimpleIntLink(link_id=link_count, src_node=self.routers[mem_ctrl_idx], dst_node=self.routers[l3_idx]))
-
-    
-        if self._has_dma_ports: 
-            dma0_idx = mem_ctrl_idx + 1
-            # DMA0 ↔ L3 
-            link_count += 1
-            int_links.append(SimpleIntLink(link_id=link_count,
-                                        src_node=self.routers[dma0_idx],
-                                        dst_node=self.routers[l3_idx]))
-            link_count += 1
-            int_links.append(SimpleIntLink(link_id=link_count,
-                                        src_node=self.routers[l3_idx],
-                                        dst_node=self.routers[dma0_idx]))
-
-            # DMA1 ↔ L3
-            dma1_idx = mem_ctrl_idx + 2
-
-            link_count += 1
-            int_links.append(SimpleIntLink(link_id=link_count,
-                                        src_node=self.routers[dma1_idx],
-                                        dst_node=self.routers[l3_idx]))
-            link_count += 1
-            int_links.append(SimpleIntLink(link_id=link_count,
-                                        src_node=self.routers[l3_idx],
-                                        dst_node=self.routers[dma1_idx]))
-
-
-        self.int_links = int_links
\ No newline at end of file
+            l2_idx = router_of["l2"][core_idx // self._cores_per_cluster]
+            l1d_idx = router_of["l1d"][core_idx]
+            l1i_idx = router_of["l1i"][core_idx]
+
+            edges.extend(
+                [(l1d_idx, l2_idx), (l1i_idx, l2_idx), (l2_idx, l1d_idx), (l2_idx, l1i_idx)]
+            )
+        return edges
+
+    def _build_star(self, num_ctrls):
+        router_of = self._router_of
+        edges = self._build_l1_edges()
+
+        # L2s, MemCtrls and DMAs ↔ L3, whatever their count
+        spokes = router_of["l2"] + router_of["mc"] + router_of["dma"]
+        for l3_idx, idx in product(router_of["l3"], spokes):
+            edges.extend([(idx, l3_idx), (l3_idx, idx)])
+
+        return num_ctrls, edges
+
+    def _build_mesh(self, num_ctrls, rows, cols):
+        router_of = self._router_of
+        edges = self._build_l1_edges()
+
+        # Everything but the L1s sits on the mesh: L2s, L3s, MemCtrls, DMAs
+        backbone = router_of["l2"] + router_of["mc"] + router_of["dma"]
+
+        # The L3 banks go to the middle of the mesh, the other nodes fill the
+        # remaining slots in order, the leftover slots get a plain router
+        num_fillers = rows * cols - len(backbone) - len(router_of["l3"])
+        nodes = backbone + list(range(num_ctrls, num_ctrls + num_fillers))
+        middle = (rows // 2) * cols + cols // 2
+        nodes[middle:middle] = router_of["l3"]
+
+        for row in range(rows):
+            for col in range(cols):
+                node = nodes[row * cols + col]
+                if col + 1 < cols:
+                    east = nodes[row * cols + col + 1]
+                    edges.extend([(node, east), (east, node)])
+                if row + 1 < rows:
+                    south = nodes[(row + 1) * cols + col]
+                    edges.extend([(node, south), (south, node)])
+
+        return num_ctrls + num_fillers, edges
+
+    def _build_crossbar(self, num_ctrls):
+        # A single extra router every controller is linked to
+        xbar_idx = num_ctrls
+        edges = []
+        for i in range(num_ctrls):
+            edges.extend([(i, xbar_idx), (xbar_idx, i)])
+
+        return num_ctrls + 1, edges
@@ -23,6 +23,8 @@
 # THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
 # (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
 # OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+from types import MappingProxyType
+
 from m5.objects import (
     NULL,
     ClockDomain,
@@ -38,6 +40,51 @@ from gem5.components.cachehierarchies.chi.nodes.abstract_node import AbstractNod
 class SharedL2(AbstractNode):
     """An L2 slice"""
 
+    _defaults = MappingProxyType(
+        {
+            # Set up home node that allows three hop protocols
+            "is_HN": False,
+            "enable_DMT": False,
+            "enable_DCT": False,
+            "allow_SD": True,
+
+            # Some reasonable default TBE params
+            "number_of_TBEs": 32,
+            "number_of_repl_TBEs": 32,
+            "number_of_snoop_TBEs": 1,
+            "number_of_DVM_TBEs": 1,  # should not receive any dvm
+            "number_of_DVM_snoop_TBEs": 1,  # should not receive any dvm
+            "unify_repl_TBEs": False,
+
+            # MOESI / Mostly inclusive for shared / Exclusive for unique
+            "alloc_on_seq_acc": True,
+            "alloc_on_seq_line_write": True,
+            "alloc_on_readshared": True,
+            "alloc_on_readunique": True,
+            "alloc_on_readonce": True,
+            "alloc_on_writeback": True,
+            "alloc_on_atomic": True,
+
+            ## Avoid conflicting “alloc & dealloc on same request”
+            "dealloc_on_unique": False,
+            "dealloc_on_shared": False,
+
+            ## Enforce inclusion via child evictions/downgrades (back-inv)
+            "dealloc_backinv_unique": True,
+            "dealloc_backinv_shared": True,
+
+            # Latencies 
+            "read_hit_latency": 12,
+            "read_miss_latency": 14,
+            "atomic_op_latency": 12,
+            "write_fe_latency": 12,  # Front-end: Rcv req -> Snd req
+            "write_be_latency": 12,  # Back-end: Rcv ack -> Snd data
+            "fill_latency": 12,
+            "snp_latency": 12,
+            "snp_inv_latency": 12,
+        }
+    )
+
     def __init__(
         self,
         size: str,
@@ -69,44 +116,6 @@ class SharedL2(AbstractNode):
             self.prefetcher = prefetcher_    
 
 
-        # Set up home node that allows three hop protocols
-        self.is_HN = False 
-        self.enable_DMT = False
-        self.enable_DCT = False
-        self.allow_SD = True
-
-
-        # Some reasonable default TBE params
-        self.number_of_TBEs = 32
-        self.number_of_repl_TBEs = 32
-        self.number_of_snoop_TBEs = 1
-        self.number_of_DVM_TBEs = 1  # should not receive any dvm
-        self.number_of_DVM_snoop_TBEs = 1  # should not receive any dvm
-        self.unify_repl_TBEs = False
-
-        # MOESI / Mostly inclusive for shared / Exclusive for unique
-        self.alloc_on_seq_acc = True
-        self.alloc_on_seq_line_write = True
-        self.alloc_on_readshared = True
-        self.alloc_on_readunique = True
-        self.alloc_on_readonce = True
-        self.alloc_on_writeback = True
-        self.alloc_on_atomic = True
-        
-        ## Avoid conflicting “alloc & dealloc on same request”
-        self.dealloc_on_unique       = False
-        self.dealloc_on_shared       = False
-
-        ## Enforce inclusion via child evictions/downgrades (back-inv)
-        self.dealloc_backinv_unique  = True
-        self.dealloc_backinv_shared  = True
-        
-        # Latencies 
-        self.read_hit_latency = 12
-        self.read_miss_latency = 14
-        self.atomic_op_latency = 12
-        self.write_fe_latency = 12  # Front-end: Rcv req -> Snd req
-        self.write_be_latency = 12  # Back-end: Rcv ack -> Snd data
-        self.fill_latency = 12
-        self.snp_latency = 12
-        self.snp_inv_latency = 12     
+        # Fixed parameters, identical for every slice
+        for name, value in self._defaults.items():
+            setattr(self, name, value)
@@ -0,0 +1,50 @@
+# Copyright (c) 2025 Tampere University, Finland
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met: redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer;
+# redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution;
+# neither the name of the copyright holders nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+
+
+from config.chi.l3_cache_hierarchy import L3CacheHierarchy
+
+
+def default_l3(cores_per_cluster: int, topology: str = "star", num_l3_banks: int = 1) -> L3CacheHierarchy:
+    """The CHI hierarchy used by the runner scripts: 16KiB 8-way L1s, a 1MiB
+    16-way L2 per cluster and a 16MiB 32-way L3.
+
+    Goes through L3CacheHierarchy.factory, so the same configuration is only
+    built once per gem5 process.
+    """
+    return L3CacheHierarchy.factory(
+        l1_size="16KiB",
+        l1_assoc=8,
+        l2_size="1MiB",
+        l2_assoc=16,
+        l3_size="16MiB",
+        l3_assoc=32,
+        cores_per_cluster=cores_per_cluster,
+        topology=topology,
+        num_l3_banks=num_l3_banks,
+    )
@@ -63,8 +63,12 @@ Usage
 
 
 import argparse
+import shutil
+import subprocess
+
 import m5
 from m5.objects import Root
+from m5.util import warn
 
 from gem5.components.boards.riscv_board import RiscvBoard
 from gem5.components.memory import DualChannelDDR4_2400, SingleChannelDDR3_1600
@@ -113,6 +117,19 @@ parser.add_argument(
     choices=["chi", "mesi-three-level", "no-cache"],
     help="Cache hierarchy class to use",
 )
+parser.add_argument(
+    "--topology",
+    type=str,
+    default="star",
+    choices=["star", "mesh", "crossbar"],
+    help="CHI network topology, mesh spreads the L3 traffic for large core counts (>= 8 cores)",
+)
+parser.add_argument(
+    "--num-l3-banks",
+    type=int,
+    default=1,
+    help="Number of address-interleaved L3 banks (power of 2), the L3 size is split across them",
+)
 
 parser.add_argument(
     "--cpu-type",
@@ -141,6 +158,12 @@ parser.add_argument("--load-checkpoint", action="store_true",
                     help="Load from an existing checkpoint instead of booting fresh")
 parser.add_argument("--checkpoint-path", type=str, default=CHECKPOINT_DEFAULT,
                     help="Path to the checkpoint directory")
+parser.add_argument("--checkpoint-staging-dir", type=str, default=None,
+                    help="Fast local directory (e.g. under /dev/shm) the checkpoint is saved to first, "
+                    "it is then moved to --checkpoint-path by a background mv while the simulation goes on")
+parser.add_argument("--warmup-insts", type=int, default=0,
+                    help="Instructions run on the detailed cores at the ROI start to warm up the "
+                    "caches before the stats are reset (default: 0, no warmup)")
 
 args = parser.parse_args()
 
@@ -155,16 +178,12 @@ if args.cache_class == "no-cache":
     cache_hierarchy = NoCache()
 elif args.cache_class == "chi":
     # Custom CHI-based hierarchy
-    from config.chi.l3_cache_hierarchy import L3CacheHierarchy
+    from config.chi.presets import default_l3
     
-    cache_hierarchy = L3CacheHierarchy(
-        l1_size="16KiB",
-        l1_assoc=8,
-        l2_size="1MiB",
-        l2_assoc=16,
-        l3_size="16MiB",
-        l3_assoc=32,
+    cache_hierarchy = default_l3(
         cores_per_cluster=args.cores_per_cluster,
+        topology=args.topology,
+        num_l3_banks=args.num_l3_banks,
     )
 elif args.cache_class == "mesi-three-level": 
     from gem5.components.cachehierarchies.ruby.mesi_three_level_cache_hierarchy import (
@@ -180,7 +199,7 @@ elif args.cache_class == "mesi-three-level":
         l2_assoc=4,
         l3_size="16MiB",
         l3_assoc=16,
-        num_l3_banks=1,
+        num_l3_banks=args.num_l3_banks,
     )
 else:
     raise ValueError(f"The cache class {args.cache_class} is not supported.")
@@ -210,6 +229,8 @@ else:
     raise ValueError(f"Unsupported CPU type: {args.cpu_type}")
 
 
+# gem5 only has KVM cores for X86 and ARM, a RISC-V boot always runs on the
+# atomic cores: use --save-checkpoint/--load-checkpoint to only boot once
 processor = SimpleSwitchableProcessor(
     starting_core_type=CPUTypes.ATOMIC,
     switch_core_type=core_type,
@@ -265,40 +286,87 @@ board.set_kernel_disk_workload(
 # Exit event handler
 # -------------------------------------------------------
 
-if args.load_checkpoint:
-    def exit_event_handler():
+# A restored run starts after the boot exit, it only sees the ROI exits
+def roi_exit_handler():
 
-        print("Second exit: Entering benchamrk ROI")
+    print("Second exit: Entering benchamrk ROI")
 
-        print("Switching from Atomic Cores to SimpleTiming Cores...")
-        processor.switch()
+    print("Switching from Atomic Cores to SimpleTiming Cores...")
+    processor.switch()
 
-        yield False
-        
-        print("Third exit: Final Exit")
-        yield True
+    # Only the ROI is of interest, the boot stats are dropped here
+    print("Resetting stats at the start of ROI!")
+    m5.stats.reset()
+
+    if args.warmup_insts:
+        # The atomic cores bypass the Ruby caches (atomic_noncaching), the
+        # caches are cold at the switch: warm them up before measuring, the
+        # stats are reset again after the warmup
+        print(f"Warming up the caches for {args.warmup_insts} instructions...")
+        simulator.schedule_max_insts(args.warmup_insts)
+
+    yield False
+    
+    print("Third exit: Final Exit")
+    if args.warmup_insts and not warmup_done:
+        warn("The ROI ended before the end of the warmup, the stats include the warmup.")
+    yield True
+
+
+# The checkpoint is saved to the staging directory, then moved to its final
+# path by a separate mv process. A Python thread would not do: m5.simulate()
+# holds the GIL, the move would barely run before the end of the simulation.
+# The mv is waited on once simulator.run() returns
+checkpoint_mover = None
 
-else:
-    def exit_event_handler():
-        print("First exit: kernel booted")
 
-        if args.save_checkpoint:
-            print(f"Saving checkpoint to {args.checkpoint_path} ...")
-            simulator.save_checkpoint(args.checkpoint_path)
-        else:
-            print("Checkpoint saving disabled (skipping).")
+def save_staged_checkpoint():
+    global checkpoint_mover
 
-        yield False
+    staging_path = os.path.join(
+        args.checkpoint_staging_dir, os.path.basename(os.path.normpath(args.checkpoint_path))
+    )
+    print(f"Saving checkpoint to {staging_path} ...")
+    simulator.save_checkpoint(staging_path)
+
+    # mv would move the checkpoint inside an existing directory, replace it
+    if os.path.isdir(args.checkpoint_path):
+        shutil.rmtree(args.checkpoint_path)
+    parent_dir = os.path.dirname(os.path.normpath(args.checkpoint_path))
+    if parent_dir:
+        os.makedirs(parent_dir, exist_ok=True)
+
+    print(f"Moving checkpoint to {args.checkpoint_path} in the background ...")
+    checkpoint_mover = subprocess.Popen(["mv", staging_path, args.checkpoint_path])
+
+
+# Reached after --warmup-insts instructions in the ROI
+warmup_done = False
+
+
+def warmup_exit_handler():
+    global warmup_done
 
-        print("Second exit: Entering benchamrk ROI")
+    print("Warmup done, resetting stats!")
+    m5.stats.reset()
+    warmup_done = True
+    yield False
 
-        print("Switching from Atomic Cores to SimpleTiming Cores...")
-        processor.switch()
 
-        yield False
-        
-        print("Third exit: Final Exit")
-        yield True
+def boot_exit_handler():
+    print("First exit: kernel booted")
+
+    if args.save_checkpoint and args.checkpoint_staging_dir:
+        save_staged_checkpoint()
+    elif args.save_checkpoint:
+        print(f"Saving checkpoint to {args.checkpoint_path} ...")
+        simulator.save_checkpoint(args.checkpoint_path)
+    else:
+        print("Checkpoint saving disabled (skipping).")
+
+    yield False
+
+    yield from roi_exit_handler()
 
 
 
@@ -312,20 +380,25 @@ if args.load_checkpoint:
     simulator = Simulator(
         board=board,
         checkpoint_path=args.checkpoint_path,
-        on_exit_event={ExitEvent.EXIT: exit_event_handler()},
+        on_exit_event={
+            ExitEvent.EXIT: roi_exit_handler(),
+            ExitEvent.MAX_INSTS: warmup_exit_handler(),
+        },
     )
 else:
     simulator = Simulator(
         board=board,
-        on_exit_event={ExitEvent.EXIT: exit_event_handler()},
+        on_exit_event={
+            ExitEvent.EXIT: boot_exit_handler(),
+            ExitEvent.MAX_INSTS: warmup_exit_handler(),
+        },
     )
 
 
-# Reset statistics
-m5.stats.reset()
-
 simulator.run()
 
-
-
-
+if checkpoint_mover is not None:
+    print("Waiting for the checkpoint move to finish ...")
+    if checkpoint_mover.wait() != 0:
+        warn(f"Moving the checkpoint to {args.checkpoint_path} failed, "
+             f"it is left in {args.checkpoint_staging_dir}.")
@@ -68,6 +68,7 @@ import time
 
 import m5
 from m5.objects import Root
+from m5.util import warn
 
 from gem5.components.boards.x86_board import X86Board
 from gem5.components.memory import DualChannelDDR4_2400, SingleChannelDDR3_1600
@@ -86,15 +87,6 @@ from gem5.utils.requires import requires
 from gem5.components.processors.simple_switchable_processor import SimpleSwitchableProcessor
 
 
-
-
-# Verify ISA
-# We check for the required gem5 build.
-requires(
-    isa_required=ISA.X86,
-    kvm_required=True,
-)
-
 import os 
 
 
@@ -118,6 +110,19 @@ parser.add_argument(
     choices=["chi", "mesi-three-level", "no-cache"],
     help="Cache hierarchy class to use",
 )
+parser.add_argument(
+    "--topology",
+    type=str,
+    default="star",
+    choices=["star", "mesh", "crossbar"],
+    help="CHI network topology, mesh spreads the L3 traffic for large core counts (>= 8 cores)",
+)
+parser.add_argument(
+    "--num-l3-banks",
+    type=int,
+    default=1,
+    help="Number of address-interleaved L3 banks (power of 2), the L3 size is split across them",
+)
 
 parser.add_argument(
     "--cpu-type",
@@ -151,6 +156,19 @@ args = parser.parse_args()
 
 
 
+# Verify ISA
+# We check for the required gem5 build. Hosts without KVM (containers,
+# ARM/macOS) boot on atomic cores rather than aborting.
+kvm_available = os.access("/dev/kvm", os.R_OK | os.W_OK)
+if not kvm_available:
+    warn("KVM is not available on this host, booting on atomic cores instead.")
+
+requires(
+    isa_required=ISA.X86,
+    kvm_required=kvm_available,
+)
+
+
 # -------------------------------------------------------
 # Cache hierarchy setup
 # -------------------------------------------------------
@@ -160,16 +178,12 @@ if args.cache_class == "no-cache":
     cache_hierarchy = NoCache()
 elif args.cache_class == "chi":
     # Custom CHI-based hierarchy
-    from config.chi.l3_cache_hierarchy import L3CacheHierarchy
+    from config.chi.presets import default_l3
     
-    cache_hierarchy = L3CacheHierarchy(
-        l1_size="16KiB",
-        l1_assoc=8,
-        l2_size="1MiB",
-        l2_assoc=16,
-        l3_size="16MiB",
-        l3_assoc=32,
+    cache_hierarchy = default_l3(
         cores_per_cluster=args.cores_per_cluster,
+        topology=args.topology,
+        num_l3_banks=args.num_l3_banks,
     )
 elif args.cache_class == "mesi-three-level": 
     from gem5.components.cachehierarchies.ruby.mesi_three_level_cache_hierarchy import (
@@ -185,7 +199,7 @@ elif args.cache_class == "mesi-three-level":
         l2_assoc=4,
         l3_size="16MiB",
         l3_assoc=16,
-        num_l3_banks=1,
+        num_l3_banks=args.num_l3_banks,
     )
 else:
     raise ValueError(f"The cache class {args.cache_class} is not supported.")
@@ -213,7 +227,7 @@ else:
 
 
 processor = SimpleSwitchableProcessor(
-    starting_core_type=CPUTypes.KVM,
+    starting_core_type=CPUTypes.KVM if kvm_available else CPUTypes.ATOMIC,
     switch_core_type=core_type,
     isa=ISA.X86,
     num_cores=args.num_cores,
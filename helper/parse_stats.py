@@ -31,95 +31,415 @@
 import json
 import sys
 import argparse
+import contextlib
+import csv
+import functools
+import io
+import mmap
 import os 
+import re
+import shutil
+import tempfile
+from concurrent.futures import Future, ProcessPoolExecutor
 
-import matplotlib.pyplot as plt
 import numpy as np
 
+# Optional, streams the stats file instead of loading it whole. Only with a
+# compiled backend (yajl2_c...), the pure python one is slower than loading it
+try:
+    import ijson
+
+    if ijson.backend == "python":
+        ijson = None
+except ImportError:
+    ijson = None
+
+# Optional, faster than json when the whole file has to be loaded: orjson,
+# else ujson. All of them parse bytes, orjson also parses a mapped file in
+# place (no copy of the whole file in memory)
+try:
+    from orjson import loads as json_loads
+
+    json_loads_mapped = True
+except ImportError:
+    json_loads_mapped = False
+    try:
+        from ujson import loads as json_loads
+    except ImportError:
+        json_loads = json.loads
+
+
+# The only parts of the stats the parser looks at, the caches (the L2s are
+# under the L1s). l3cache and core_clusters are for older stats files
+STATS_PREFIXES = (
+    "simTicks",
+    "simFreq",
+    "simInsts",
+    "board.cache_hierarchy.l3caches",
+    "board.cache_hierarchy.l3cache",
+    "board.cache_hierarchy.dcaches",
+    "board.cache_hierarchy.icaches",
+    "board.cache_hierarchy.core_clusters",
+)
+
+# Characters replaced by "_" in the plot file names
+_UNSAFE_NAME_RE = re.compile(r"::|/")
+
+# The style of all the plots, the axes get it when they are created or
+# cleared instead of every plot setting it again
+_PLOT_STYLE = {
+    "axes.grid": True,
+    "axes.grid.axis": "y",
+    "grid.linestyle": "--",
+    "grid.alpha": 0.7,
+}
+
+# Above that many bins, the outline of the histogram is not drawn: it would
+# cover the bars
+_OUTLINE_MAX_BINS = 128
+
+
+def _new_figure(**figure_args):
+    import matplotlib
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    matplotlib.rcParams.update(_PLOT_STYLE)
+    fig = Figure(dpi=72, **figure_args)
+    return fig, FigureCanvasAgg(fig)
+
+
+# A single figure is drawn on and saved for every histogram, no pyplot.
+# Created on the first plot, so matplotlib is not even imported with --no-plots
+_AX = None
+_CANVAS = None
+
+
+def _get_axes():
+    global _AX, _CANVAS
+
+    if _AX is None:
+        fig, _CANVAS = _new_figure(figsize=(8, 5))
+        _AX = fig.add_subplot(111)
+
+    return _AX, _CANVAS
+
+
+
+# (hits, misses, total accesses, hit ratio) of each cache of a list, the ratios
+# of all the caches are computed at once on arrays
+def cache_hit_stats(components):
+    num_components = len(components)
+    caches = [component["cache"] for component in components]
+    hits = np.fromiter(
+        (cache["m_demand_hits"]["value"] for cache in caches), dtype=np.int64, count=num_components
+    )
+    misses = np.fromiter(
+        (cache["m_demand_misses"]["value"] for cache in caches), dtype=np.int64, count=num_components
+    )
+    total_accesses = hits + misses
 
+    # A cache that was never accessed (e.g. an idle L3 bank) has no ratio: nan,
+    # not a 0% hit ratio
+    hit_ratios = np.divide(
+        hits, total_accesses, out=np.full(num_components, np.nan), where=total_accesses != 0
+    )
 
-def scalar_stats(component, id_):
-    cache_hit_accesses = component["cache"]["m_demand_hits"]["value"]
-    cache_miss_accesses = component["cache"]["m_demand_misses"]["value"]
-    total_accesses = cache_hit_accesses + cache_miss_accesses
+    return list(
+        zip(hits.tolist(), misses.tolist(), total_accesses.tolist(), hit_ratios.tolist())
+    )
 
-    hit_ratio = cache_hit_accesses / (total_accesses)
 
+# the name of a cache in the report
+def component_name_of(component):
     component_name = component["name"]   
 
     if component_name == "downstream_destinations":
         component_name = "l2_cache" 
 
-        
+    return component_name
+
+
+# prints the stats of one cache, total_accesses and hit_ratio come from its
+# entry in cache_hit_stats
+def scalar_stats(component, id_, total_accesses, hit_ratio):
+    component_name = component_name_of(component)
+
     print(f"\n\n ====== {component_name} Cache Component Stats ======")
     print(f"{component_name}_{id_} Total Accesses: {total_accesses}")
     print(f"{component_name}_{id_} Cache Hit percentage: {hit_ratio * 100}%")
 
     
-# parses and plots delay histograms for a CHI transaction
-# dumps the images as a png to plot_dir 
-def get_transaction_hist(transaction, component, id_, plot_dir):
+# the num_edges edges of the histogram bins (one more than the bins), the
+# caches share the same bins: the array is shared by all the calls, it is
+# read-only
+@functools.lru_cache(maxsize=16)
+def _bin_edges(num_edges, bin_size):
+    # Integer indices scaled once: arange with a float step can yield one edge
+    # too many
+    edges = np.multiply(np.arange(num_edges, dtype=np.int64), bin_size, dtype=np.float64)
+    edges.flags.writeable = False
+    return edges
+
+
+# --fast-plot: bar charts with a title but no axes, drawn straight into a
+# grayscale image of about _FAST_PLOT_WIDTH x _FAST_PLOT_HEIGHT pixels (bars)
+# under a _FAST_PLOT_TITLE_HEIGHT pixels title band
+_FAST_PLOT_WIDTH = 576
+_FAST_PLOT_HEIGHT = 360
+_FAST_PLOT_TITLE_HEIGHT = 16
+
+
+@functools.lru_cache(maxsize=1)
+def _fast_plot_font():
+    from PIL import ImageFont
+
+    return ImageFont.load_default()
+
+
+def _save_fast_plot(counts, bin_size, title, plot_path):
+    from PIL import Image, ImageDraw
+
+    peak = counts.max()
+    if peak > 0:
+        heights = np.rint(counts / peak * _FAST_PLOT_HEIGHT)
+    else:
+        heights = np.zeros_like(counts)
+
+    # Row 0 is the top of the image, a pixel is black if its bar reaches it
+    row_levels = np.arange(_FAST_PLOT_HEIGHT, 0, -1)[:, np.newaxis]
+    pixels = np.where(row_levels <= heights, 0, 255).astype(np.uint8)
+
+    # Same width for every bin, with a blank column between the bars
+    bar_width = max(1, _FAST_PLOT_WIDTH // len(counts))
+    pixels = np.repeat(pixels, bar_width, axis=1)
+    if bar_width > 2:
+        pixels[:, bar_width - 1::bar_width] = 255
+
+    # The title band on top, a black baseline under the bars
+    image = np.full(
+        (_FAST_PLOT_TITLE_HEIGHT + _FAST_PLOT_HEIGHT + 1, pixels.shape[1]), 255, dtype=np.uint8
+    )
+    image[_FAST_PLOT_TITLE_HEIGHT:-1] = pixels
+    image[-1] = 0
+
+    image = Image.fromarray(image)
+    ImageDraw.Draw(image).text(
+        (4, 2), f"{title} (bin size = {bin_size})", fill=0, font=_fast_plot_font()
+    )
+    # Fast rather than small files
+    image.save(plot_path, compress_level=1)
+
+
+# plots one histogram to plot_path, run in a worker process: only gets the
+# counts, not the stats. Returns the line to print
+# With a staging_dir (e.g. on a tmpfs), the png is written there then moved
+# to plot_path in one go, rather than written piecewise to a slow plot_dir
+def _plot_hist(counts, bin_size, title, plot_path, fast_plot, staging_dir):
+    save = _save_fast_plot if fast_plot else _save_plot
+    return _save_staged(save, (counts, bin_size, title), plot_path, staging_dir)
+
+
+# plots all the histograms of panels, (counts, bin_size, title) tuples, in a
+# single figure, one panel under the other. Same as _plot_hist otherwise
+def _plot_hists(panels, plot_path, staging_dir):
+    return _save_staged(_save_multi_plot, (panels,), plot_path, staging_dir)
+
+
+def _save_staged(save, save_args, plot_path, staging_dir):
+    save_path = plot_path
+    if staging_dir is not None:
+        save_path = os.path.join(staging_dir, os.path.basename(plot_path))
+
+    save(*save_args, save_path)
+
+    if staging_dir is not None:
+        shutil.move(save_path, plot_path)
+
+    return f"Saved histogram: {plot_path}"
+
+
+def _draw_hist(ax, counts, bin_size, title):
+    # The edges of all the bins, the last one closes the last bin
+    edges = _bin_edges(len(counts) + 1, bin_size)
+
+    # The histogram is one filled path rather than a patch per bar
+    edgecolor = "black" if len(counts) <= _OUTLINE_MAX_BINS else "none"
+    ax.stairs(counts, edges, fill=True, edgecolor=edgecolor, linewidth=0.5)
+    ax.set_title(title)
+    ax.set_xlabel(f"Latency (cycles, bin size = {bin_size})")
+    ax.set_ylabel("Count")
+
+
+def _save_plot(counts, bin_size, title, plot_path):
+    ax, canvas = _get_axes()
+    ax.clear()
+    _draw_hist(ax, counts, bin_size, title)
+
+    # Save
+    canvas.print_png(plot_path)
+
+
+def _save_multi_plot(panels, plot_path):
+    fig, canvas = _new_figure(figsize=(8, 2.5 * len(panels)), layout="constrained")
+    axes = fig.subplots(len(panels), 1, squeeze=False)[:, 0]
+    for ax, (counts, bin_size, title) in zip(axes, panels):
+        _draw_hist(ax, counts, bin_size, title)
+
+    canvas.print_png(plot_path)
+
+
+# parses the delay histogram of a CHI transaction: returns its counts, bin
+# size and plot title, None if the component has no such histogram
+def get_hist_counts(transaction, component, id_):
     # hist_name = "outTransLatHist.SendReadShared"
     component_name = component["name"]
     hist_name = transaction
 
     hist = component.get(hist_name, None)
     if not hist or hist.get("type") != "Distribution":
-        print(f"Histogram Stats for {hist_name} are not available")
-        return 
+        return None
 
     # Extract bins and counts
     num_bins = int(hist["num_bins"])
     bin_size = float(hist["bin_size"])
-    counts = [hist["value"][str(i)]["value"] for i in range(num_bins)]
-    edges = np.arange(0, num_bins * bin_size, bin_size)
+    bins = hist["value"]
+    bin_counts = np.fromiter(
+        (bin_value["value"] for bin_value in bins.values()), dtype=np.float64, count=len(bins)
+    )
 
-    # Plot
-    plt.figure(figsize=(8, 5))
-    plt.bar(edges, counts, width=bin_size * 0.9, align='edge', edgecolor='black')
-    plt.title(f"{component_name} {id_} Cache {hist_name}")
-    plt.xlabel(f"Latency (cycles, bin size = {bin_size})")
-    plt.ylabel("Count")
-    plt.grid(axis="y", linestyle="--", alpha=0.7)
+    # gem5 dumps every bin, in order: the counts are the values as they are
+    if len(bins) == num_bins:
+        return bin_counts, bin_size, f"{component_name} {id_} Cache {hist_name}"
 
-    # Save
-    safe_name = hist_name.replace("::", "_").replace("/", "_")
-    os.makedirs(plot_dir, exist_ok=True)
-    plot_path = os.path.join(plot_dir, f"{component_name}_{id_}_{safe_name}.png")
-    plt.savefig(plot_path)
-    plt.close()
-    print(f"Saved histogram: {plot_path}")
+    # Otherwise, the bins are keyed by their index as a string, numpy parses them
+    bin_indices = np.fromiter(bins.keys(), dtype=np.int64, count=len(bins))
+    counts = np.zeros(num_bins, dtype=np.float64)
+    counts[bin_indices] = bin_counts
 
+    return counts, bin_size, f"{component_name} {id_} Cache {hist_name}"
 
 
+# a done "plot" of a missing histogram, only prints it is missing
+def _unavailable_hist(transaction):
+    unavailable = Future()
+    unavailable.set_result(f"Histogram Stats for {transaction} are not available")
+    return unavailable
 
-def main():
-    parser = argparse.ArgumentParser(
-        description="Parse and visualize cache statistics from gem5 JSON stats."
-    )
-    parser.add_argument(
-        "--stats-path",
-        type=str,
-        required=True,
-        help="Path to the gem5 JSON stats file (e.g., /path/to/stats.json)",
-    )
-    parser.add_argument(
-        "--plot-dir",
-        type=str,
-        default="./plots",
-        help="Directory to save histogram plots (default: ./plots)",
+
+# plots all the delay histograms of a CHI transaction in a single figure, saved
+# to plot_dir. Returns the future of the line to print, None if plot_dir is None
+def get_transaction_hists(transaction, components, plot_dir, executor, staging_dir=None):
+    if plot_dir is None:
+        return None
+
+    panels = []
+    for id_, component in components:
+        hist_counts = get_hist_counts(transaction, component, id_)
+        if hist_counts is not None:
+            panels.append(hist_counts)
+
+    if not panels:
+        return _unavailable_hist(transaction)
+
+    safe_name = _UNSAFE_NAME_RE.sub("_", transaction)
+    plot_path = os.path.join(plot_dir, f"all_{safe_name}.png")
+
+    return executor.submit(_plot_hists, panels, plot_path, staging_dir)
+
+
+# plots the delay histogram of a CHI transaction to plot_dir (as a png) in the
+# executor. Returns the future of the line to print, None if plot_dir is None
+def get_transaction_hist(
+    transaction, component, id_, plot_dir, fast_plot, executor, staging_dir=None
+):
+    if plot_dir is None:
+        return None
+
+    hist_counts = get_hist_counts(transaction, component, id_)
+    if hist_counts is None:
+        return _unavailable_hist(transaction)
+    counts, bin_size, title = hist_counts
+
+    safe_name = _UNSAFE_NAME_RE.sub("_", transaction)
+    plot_path = os.path.join(plot_dir, f"{component['name']}_{id_}_{safe_name}.png")
+
+    return executor.submit(
+        _plot_hist, counts, bin_size, title, plot_path, fast_plot, staging_dir
     )
 
-    args = parser.parse_args()
 
 
-    # Load JSON stats
-    with open(args.stats_path, "r") as f:
-        stats = json.load(f)
 
-    # Print top-level keys for debugging
-    print(stats.keys())
+# L2 is named L1.downstream in CHI Ruby 
+# We use either an L1i or L1d 's downstream pointer to access the corresponding L2
+def get_l2_cache(cluster):
+    for l1_cache in (cluster["dcache"], cluster["icache"]):
+        downstream = l1_cache.get("downstream_destinations")
+        if downstream:
+            return downstream["value"][0]
+    return None
+
+
+# loads the stats file, keeping only STATS_PREFIXES when ijson is available:
+# full system stats are hundreds of MB, mostly the cores and the board devices
+def load_stats(stats_path):
+    if ijson is None:
+        with open(stats_path, "rb") as f:
+            if not json_loads_mapped:
+                return json_loads(f.read())
+
+            # The view has to be released before the file is unmapped
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped_file:
+                with memoryview(mapped_file) as stats_buffer:
+                    return json_loads(stats_buffer)
+
+    stats = {}
+    builder = None
+    with open(stats_path, "rb") as f:
+        for prefix, event, value in ijson.parse(f, use_float=True):
+            if builder is None:
+                if prefix not in STATS_PREFIXES or event == "map_key":
+                    continue
+                builder = ijson.ObjectBuilder()
+                builder_prefix = prefix
+
+            builder.event(event, value)
+
+            # Done with the subtree once its value is complete
+            if prefix == builder_prefix and event not in ("start_map", "start_array", "map_key"):
+                *parents, key = builder_prefix.split(".")
+                node = stats
+                for parent in parents:
+                    node = node.setdefault(parent, {})
+                node[key] = builder.value
+                builder = None
+
+    return stats
+
+
 
+
+# writes the stats of all the caches to a csv file, one row per cache in the
+# report order. caches: (component, id, cache_hit_stats entry) tuples
+def write_summary(summary_path, caches):
+    with open(summary_path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(("component", "id", "hits", "misses", "total_accesses", "hit_ratio"))
+        for component, id_, cache_stats in caches:
+            writer.writerow((component_name_of(component), id_, *cache_stats))
+
+
+# prints the line of a get_transaction_hist plot, once it is done
+def _print_plot(plot):
+    if plot is not None:
+        print(plot.result())
+
+
+# prints the run, L3, L1 and L2 stats and plots the histograms
+def print_stats(
+    stats, plot_dir, fast_plot, jobs, staging_dir=None, single_figure=False, summary_path=None
+):
     # Extract top-level metrics
     sim_seconds = stats["simTicks"]["value"] / stats["simFreq"]["value"]
     sim_insts = stats["simInsts"]["value"]
@@ -133,36 +453,211 @@ def main():
     cache_hierarchy = board.get("cache_hierarchy", {})
 
 
-    l3_cache = cache_hierarchy["l3cache"]
-
-    scalar_stats(l3_cache, None)
-
-    get_transaction_hist("outTransLatHist.SendReadNoSnp", l3_cache, None, args.plot_dir)
+    # The L3 is split in banks (l3caches vector), stats dumped before that
+    # have a single l3cache
+    l3_caches = cache_hierarchy.get("l3caches")
+    if l3_caches is not None:
+        l3_values = l3_caches["value"]
+    else:
+        l3_values = [cache_hierarchy["l3cache"]]
+
+
+    # The L1 caches are stored in two flat vectors (dcaches/icaches, one entry
+    # per core); stats dumped before that group them per core in core_clusters
+    core_clusters = cache_hierarchy.get("core_clusters")
+    if core_clusters is not None:
+        cluster_values = core_clusters["value"]
+    else:
+        dcaches = cache_hierarchy["dcaches"]["value"]
+        icaches = cache_hierarchy["icaches"]["value"]
+        cluster_values = [
+            {"dcache": dcache, "icache": icache} for dcache, icache in zip(dcaches, icaches)
+        ]
+
+
+    # The cores of a cluster (--cores-per-cluster) share their L2, gem5 dumps
+    # it once, under the first L1 pointing to it (the cluster's first core).
+    # Each L2 is numbered as its cluster.
+    l2_indices = []
+    l2_caches = []
+    for cluster in cluster_values:
+        l2_cache = get_l2_cache(cluster)
+        if l2_cache is None:
+            l2_indices.append(None)
+        else:
+            l2_indices.append(len(l2_caches))
+            l2_caches.append(l2_cache)
+
+    # The hit ratios of all the caches
+    l3_stats = cache_hit_stats(l3_values)
+    icache_stats = cache_hit_stats([cluster["icache"] for cluster in cluster_values])
+    dcache_stats = cache_hit_stats([cluster["dcache"] for cluster in cluster_values])
+    l2_stats = cache_hit_stats(l2_caches)
+
+    if summary_path is not None:
+        summary = [
+            (l3_cache, bank_idx, l3_stats[bank_idx]) for bank_idx, l3_cache in enumerate(l3_values)
+        ]
+        for cluster_idx, cluster in enumerate(cluster_values):
+            summary.append((cluster["icache"], cluster_idx, icache_stats[cluster_idx]))
+            summary.append((cluster["dcache"], cluster_idx, dcache_stats[cluster_idx]))
+            l2_idx = l2_indices[cluster_idx]
+            if l2_idx is not None:
+                summary.append((l2_caches[l2_idx], l2_idx, l2_stats[l2_idx]))
+        write_summary(summary_path, summary)
+
+    # All the histograms are plotted in parallel while the stats are printed,
+    # each in order once its plot is done
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        # The histograms of the L3 banks then of the L2s, in a single figure
+        # printed after all the stats instead of a file per cache
+        if single_figure:
+            all_plots = get_transaction_hists(
+                "outTransLatHist.SendReadNoSnp",
+                [*enumerate(l3_values), *enumerate(l2_caches)],
+                plot_dir,
+                executor,
+                staging_dir,
+            )
+            plot_dir = None
+
+        l3_plots = [
+            get_transaction_hist(
+                "outTransLatHist.SendReadNoSnp",
+                l3_cache,
+                bank_idx,
+                plot_dir,
+                fast_plot,
+                executor,
+                staging_dir,
+            )
+            for bank_idx, l3_cache in enumerate(l3_values)
+        ]
+        l2_plots = [
+            get_transaction_hist(
+                "outTransLatHist.SendReadNoSnp",
+                l2_cache,
+                l2_idx,
+                plot_dir,
+                fast_plot,
+                executor,
+                staging_dir,
+            )
+            for l2_idx, l2_cache in enumerate(l2_caches)
+        ]
+
+        for bank_idx, l3_cache in enumerate(l3_values):
+            _, _, total_accesses, hit_ratio = l3_stats[bank_idx]
+            scalar_stats(l3_cache, bank_idx, total_accesses, hit_ratio)
+            _print_plot(l3_plots[bank_idx])
+
+        # Iterate through all core clusters
+        for cluster_idx, cluster in enumerate(cluster_values):
+            _, _, total_accesses, hit_ratio = icache_stats[cluster_idx]
+            scalar_stats(cluster["icache"], cluster_idx, total_accesses, hit_ratio)
+
+            _, _, total_accesses, hit_ratio = dcache_stats[cluster_idx]
+            scalar_stats(cluster["dcache"], cluster_idx, total_accesses, hit_ratio)
+
+            l2_idx = l2_indices[cluster_idx]
+            if l2_idx is not None:
+                _, _, total_accesses, hit_ratio = l2_stats[l2_idx]
+                scalar_stats(l2_caches[l2_idx], l2_idx, total_accesses, hit_ratio)
+                _print_plot(l2_plots[l2_idx])
+
+        if single_figure:
+            _print_plot(all_plots)
 
 
-    clusters = cache_hierarchy["core_clusters"]
-    ruby_system = cache_hierarchy["ruby_system"]
-    cluster_values = clusters["value"] 
 
 
-    # print((cluster_values[0])["dcache"]["cache"]["m_demand_hits"]["value"])
-    # Iterate through all core clusters
-    for cluster_idx, cluster in enumerate(cluster_values):
-        cache_component = cluster.get("icache", None)
-        scalar_stats(cache_component, cluster_idx)
-
-        cache_component = cluster.get("dcache", None)
-        scalar_stats(cache_component, cluster_idx)
+def main():
+    parser = argparse.ArgumentParser(
+        description="Parse and visualize cache statistics from gem5 JSON stats."
+    )
+    parser.add_argument(
+        "--stats-path",
+        type=str,
+        required=True,
+        help="Path to the gem5 JSON stats file (e.g., /path/to/stats.json)",
+    )
+    parser.add_argument(
+        "--plot-dir",
+        type=str,
+        default="./plots",
+        help="Directory to save histogram plots (default: ./plots)",
+    )
+    parser.add_argument(
+        "--no-plots",
+        action="store_true",
+        help="Only print the stats, do not plot the histograms",
+    )
+    parser.add_argument(
+        "--fast-plot",
+        action="store_true",
+        help="Save plain bar charts (a title, no axes) with Pillow instead of matplotlib, "
+        "for batch runs",
+    )
+    parser.add_argument(
+        "--single-figure",
+        action="store_true",
+        help="Plot all the histograms in one figure (one panel per cache) instead of one "
+        "file per cache",
+    )
+    parser.add_argument(
+        "--plot-staging-dir",
+        type=str,
+        default=None,
+        help="Fast local directory (e.g. /dev/shm) the plots are written to first, each is "
+        "then moved to --plot-dir (for a slow or network mounted --plot-dir)",
+    )
+    parser.add_argument(
+        "--summary-csv",
+        type=str,
+        default=None,
+        help="Also write the hits, misses and hit ratio of every cache to this csv file",
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=None,
+        help="Number of processes plotting the histograms (default: number of host cores)",
+    )
 
-        # L2 is named L1.downstream in CHI Ruby 
-        # We use either an L1i or L1d 's downstream pointer to access the corresponding L2
-        l2_cache = cache_component["downstream_destinations"]["value"][0]
-        scalar_stats(l2_cache, cluster_idx)
+    args = parser.parse_args()
 
-        get_transaction_hist("outTransLatHist.SendReadNoSnp", l2_cache, cluster_idx, args.plot_dir)
-        
-        # //  does not work on a docker env
-        # plt.show()
+    if args.fast_plot and args.single_figure:
+        parser.error("--fast-plot and --single-figure are mutually exclusive")
+
+    # Load JSON stats, before the staging directory is created: a missing or
+    # broken stats file must not leave it behind
+    stats = load_stats(args.stats_path)
+
+    staging_dir = None
+    if args.no_plots:
+        args.plot_dir = None
+    else:
+        os.makedirs(args.plot_dir, exist_ok=True)
+        if args.plot_staging_dir:
+            staging_dir = tempfile.mkdtemp(dir=args.plot_staging_dir)
+
+    # Everything is printed in one write at the end (or on error)
+    output = io.StringIO()
+    try:
+        with contextlib.redirect_stdout(output):
+            print_stats(
+                stats,
+                args.plot_dir,
+                args.fast_plot,
+                args.jobs,
+                staging_dir,
+                args.single_figure,
+                args.summary_csv,
+            )
+    finally:
+        sys.stdout.write(output.getvalue())
+        if staging_dir is not None:
+            shutil.rmtree(staging_dir, ignore_errors=True)
 
 
 if __name__ == "__main__":